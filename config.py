@@ -1,35 +1,47 @@
 # config.py
 from __future__ import annotations
-import json
 import os
 from dataclasses import dataclass
-from datetime import datetime, time, timedelta
-from typing import Optional
+from datetime import datetime, timedelta
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Any, Mapping, Optional
 
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 
 
 _CONFIG_PATH = os.environ.get("WMS_CONFIG_PATH", "config.json")
 
 
 class WMSSettings(BaseModel):
+    model_config = ConfigDict(frozen=True, extra="forbid")
+
     base_url: str
     username: str
     password: str
     verify_ssl: bool = True
+    default_concurrency: int = 10
     default_timeout: float = 30.0
     default_retries: int = 3
+    # accepted so existing config.json files still validate, but ignored:
+    # WMSClient has no retry loop to apply a backoff to
+    default_backoff_base: float = 0.5
 
 
 class DatabaseSettings(BaseModel):
+    model_config = ConfigDict(frozen=True, extra="forbid")
+
     host: str
     port: int
     user: str
     password: str
     database: str
+    bulk_mode: bool = False
 
 
 class AppConfig(BaseModel):
+    model_config = ConfigDict(frozen=True, extra="forbid")
+
     wms: WMSSettings
     database: DatabaseSettings
 
@@ -38,9 +50,10 @@ class AppConfig(BaseModel):
         p = path or _CONFIG_PATH
         if not os.path.exists(p):
             raise FileNotFoundError(f"Config file not found: {p}")
-        with open(p, "r", encoding="utf-8") as f:
-            raw = json.load(f)
-        return cls.parse_obj(raw)
+        # pydantic-core parses and validates the JSON in one pass,
+        # without building an intermediate dict
+        with open(p, "rb") as f:
+            return cls.model_validate_json(f.read())
 
 
 # convenience functions used by other modules (keeps old names)
@@ -54,14 +67,17 @@ def load_config(path: Optional[str] = None) -> AppConfig:
     return _cfg
 
 
-def get_wms_config() -> dict:
+# the derived dicts are built once and handed out read-only
+@lru_cache(maxsize=1)
+def get_wms_config() -> Mapping[str, Any]:
     cfg = load_config()
-    return cfg.wms.dict()
+    return MappingProxyType(cfg.wms.model_dump())
 
 
-def get_database_config() -> dict:
+@lru_cache(maxsize=1)
+def get_database_config() -> Mapping[str, Any]:
     cfg = load_config()
-    return cfg.database.dict()
+    return MappingProxyType(cfg.database.model_dump())
 
 
 @dataclass
@@ -75,8 +91,7 @@ def get_today_range(tz_naive: bool = True) -> DayRange:
     Default: today midnight 00:00:00 -> next midnight (local machine time).
     If you need timezone-aware logic, modify to accept tzinfo.
     """
-    now = datetime.now()
-    start = datetime.combine(now.date(), time.min)
+    start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
     end = start + timedelta(days=1)
     if tz_naive:
         return DayRange(start=start, end=end)
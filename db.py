@@ -1,66 +1,348 @@
 # db.py
+"""
+Connection pool and bulk upsert helpers for the raw_* landing tables.
+"""
+
 from __future__ import annotations
-from typing import List, Dict, Iterable, Any
+from contextlib import asynccontextmanager, contextmanager
+from functools import lru_cache
+from typing import (
+    Any,
+    AsyncIterator,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+)
+import asyncio
+import itertools
 import logging
+import operator
+import threading
+import time
 
 import psycopg
-from psycopg.rows import dict_row
+from psycopg.conninfo import make_conninfo
 from psycopg import sql
+from psycopg_pool import ConnectionPool
 
 from config import get_database_config
 
 logger = logging.getLogger(__name__)
 
+# Postgres accepts at most 65535 bind parameters per statement
+MAX_PARAMS = 65535
+# above this many rows, staging through COPY beats multi-row VALUES statements
+COPY_THRESHOLD = 1000
+# rows per transaction when callers load a large extraction in chunks; keeps
+# row locks and WAL per commit bounded while staying on the COPY path
+COMMIT_ROWS = 10_000
+
+
+_POOL: Optional[ConnectionPool] = None
+# extractors start at the same time from worker threads; without the lock
+# each first caller would build (and leak) its own pool
+_POOL_LOCK = threading.Lock()
 
-def get_connection() -> psycopg.Connection:
-    cfg = get_database_config()
-    conn = psycopg.connect(
-        host=cfg["host"],
-        port=cfg["port"],
-        user=cfg["user"],
-        password=cfg["password"],
-        dbname=cfg["database"],
-        autocommit=False,
-        row_factory=dict_row,
+
+def _configure_bulk_session(conn: psycopg.Connection) -> None:
+    """
+    Session tuning for bulk ETL loads (database.bulk_mode). With
+    synchronous_commit off a server crash can lose the last few commits;
+    see "Durability of the raw tables" in README.md.
+    """
+    conn.execute(
+        "SET synchronous_commit = off; "
+        "SET work_mem = '64MB'; "
+        "SET maintenance_work_mem = '256MB'"
     )
-    return conn
+    conn.commit()
+
+
+def get_pool() -> ConnectionPool:
+    """
+    Lazily build the process-wide connection pool so connections are reused
+    across ETL phases instead of reconnecting for every caller.
+    """
+    global _POOL
+    if _POOL is None:
+        with _POOL_LOCK:
+            if _POOL is None:
+                cfg = get_database_config()
+                _POOL = ConnectionPool(
+                    conninfo=make_conninfo(
+                        host=cfg["host"],
+                        port=cfg["port"],
+                        user=cfg["user"],
+                        password=cfg["password"],
+                        dbname=cfg["database"],
+                    ),
+                    min_size=2,
+                    max_size=10,
+                    # default tuple rows; readers that want dicts opt in per cursor
+                    # with conn.cursor(row_factory=dict_row)
+                    # prepare_threshold=1: the VALUES upsert shapes and the staging
+                    # merge are server-prepared from their second execution and
+                    # stay prepared on the connection across checkouts (until a
+                    # ROLLBACK makes psycopg discard them); the staging DDL is
+                    # run unprepared, see _copy_upsert
+                    kwargs={"autocommit": False, "prepare_threshold": 1},
+                    configure=_configure_bulk_session if cfg.get("bulk_mode") else None,
+                    # validate connections on checkout so dropped ones get replaced
+                    check=ConnectionPool.check_connection,
+                    name="wms_etl",
+                    open=True,
+                )
+    return _POOL
+
+
+@contextmanager
+def acquire() -> Iterator[psycopg.Connection]:
+    """
+    Borrow a pooled connection. The transaction is committed when the block
+    exits cleanly and rolled back if it raises.
+    """
+    with get_pool().connection() as conn:
+        yield conn
+
+
+@asynccontextmanager
+async def acquire_async() -> AsyncIterator[psycopg.Connection]:
+    """
+    acquire() for coroutines: the pool checkout and the return (commit or
+    rollback, then handing the connection back) run in a worker thread, so
+    they don't block the event loop.
+    """
+    cm = acquire()
+    conn = await asyncio.to_thread(cm.__enter__)
+    try:
+        yield conn
+    except BaseException as e:
+        if not await asyncio.to_thread(cm.__exit__, type(e), e, e.__traceback__):
+            raise
+    else:
+        await asyncio.to_thread(cm.__exit__, None, None, None)
+
 
+def close_pool() -> None:
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is not None:
+            _POOL.close()
+            _POOL = None
 
-def _make_upsert_query(table: str, cols: List[str], pk: str = "id") -> sql.SQL:
+
+def _table_ident(table: str) -> sql.Composable:
     """
-    Build a safe SQL query for upsert using psycopg.sql
     Supports schema-qualified table names like 'public.raw_inventory'
     """
     if "." in table:
         schema, tbl = table.split(".", 1)
-        table_ident = sql.SQL("{}.{}").format(
-            sql.Identifier(schema), sql.Identifier(tbl)
+        return sql.SQL("{}.{}").format(sql.Identifier(schema), sql.Identifier(tbl))
+    return sql.Identifier(table)
+
+
+def _staging_ident(table: str) -> sql.Identifier:
+    # temp tables live in pg_temp, so only the bare table name is used
+    return sql.Identifier(f"tmp_{table.rsplit('.', 1)[-1]}")
+
+
+@lru_cache(maxsize=256)
+def _make_upsert_query(
+    table: str,
+    cols: Tuple[str, ...],
+    pk: str = "id",
+    rows_per_stmt: Optional[int] = None,
+) -> sql.Composed:
+    """
+    Build the upsert query for `table`. Rows come either from the staging
+    table (INSERT ... SELECT ... FROM tmp_{table}) or, when `rows_per_stmt`
+    is given, from that many positional VALUES groups.
+    Cached per argument tuple, so repeated ETL runs skip the SQL
+    composition entirely.
+    """
+    col_identifiers = sql.SQL(", ").join(sql.Identifier(c) for c in cols)
+
+    if rows_per_stmt is None:
+        # a key repeated in one batch would make ON CONFLICT DO UPDATE touch
+        # the same row twice, so keep only its last copy (highest _seq)
+        source = sql.SQL(
+            "SELECT DISTINCT ON ({pk}) {fields} FROM {staging} ORDER BY {pk}, _seq DESC"
+        ).format(
+            pk=sql.Identifier(pk), fields=col_identifiers, staging=_staging_ident(table)
         )
     else:
-        table_ident = sql.Identifier(table)
-
-    col_identifiers = [sql.Identifier(c) for c in cols]
-    placeholders = [sql.Placeholder(c) for c in cols]
+        row = sql.SQL("({})").format(sql.SQL(", ").join(sql.Placeholder() * len(cols)))
+        source = sql.SQL("VALUES {}").format(sql.SQL(", ").join([row] * rows_per_stmt))
 
+    insert = sql.SQL("INSERT INTO {table} ({fields}) {source}").format(
+        table=_table_ident(table), fields=col_identifiers, source=source
+    )
     updates = [
         sql.SQL("{} = EXCLUDED.{}").format(sql.Identifier(c), sql.Identifier(c))
         for c in cols
         if c != pk
     ]
+    if not updates:
+        # only the key was given: nothing to update on an existing row
+        return sql.SQL("{insert} ON CONFLICT ({pk}) DO NOTHING").format(
+            insert=insert, pk=sql.Identifier(pk)
+        )
 
-    query = sql.SQL(
-        "INSERT INTO {table} ({fields}) VALUES ({values}) "
-        "ON CONFLICT ({pk}) DO UPDATE SET {updates}"
-    ).format(
-        table=table_ident,
-        fields=sql.SQL(", ").join(col_identifiers),
-        values=sql.SQL(", ").join(placeholders),
+    query = sql.SQL("{insert} ON CONFLICT ({pk}) DO UPDATE SET {updates}").format(
+        insert=insert,
         pk=sql.Identifier(pk),
         updates=sql.SQL(", ").join(updates),
     )
     return query
 
 
+@lru_cache(maxsize=64)
+def _row_adapter(cols: Tuple[str, ...]) -> Callable[[Dict[str, Any]], Tuple[Any, ...]]:
+    """
+    Build (once per column tuple) the function that turns a row dict into
+    its positional values; keys missing from the row come out as None.
+    Rows of one batch share the flattener's key shape, so the common case is
+    a single C-level itemgetter call; rows missing a key fall back to .get.
+    """
+    getter = operator.itemgetter(*cols)
+
+    def fallback(r: Dict[str, Any]) -> Tuple[Any, ...]:
+        return tuple(map(r.get, cols))
+
+    if len(cols) == 1:
+        # itemgetter with a single key returns the bare value, not a tuple
+        def adapt(r: Dict[str, Any]) -> Tuple[Any, ...]:
+            try:
+                return (getter(r),)
+            except KeyError:
+                return fallback(r)
+
+    else:
+
+        def adapt(r: Dict[str, Any]) -> Tuple[Any, ...]:
+            try:
+                return getter(r)
+            except KeyError:
+                return fallback(r)
+
+    return adapt
+
+
+def _statement_sizes(n: int, rows_per_stmt: int) -> Iterator[int]:
+    """
+    Split n rows into full statements of rows_per_stmt rows, then cover the
+    tail with decreasing powers of two so only a handful of distinct
+    statements (and prepared plans) exist per table.
+    """
+    full, tail = divmod(n, rows_per_stmt)
+    for _ in range(full):
+        yield rows_per_stmt
+    while tail:
+        size = 1 << (tail.bit_length() - 1)
+        yield size
+        tail -= size
+
+
+def _values_upsert(
+    cur: psycopg.Cursor,
+    table: str,
+    cols: Tuple[str, ...],
+    items: List[Dict[str, Any]],
+    chunk_size: int = 500,
+    pk: str = "id",
+) -> int:
+    """
+    Upsert with multi-row INSERT ... VALUES statements, packing as many rows
+    per statement as the bind parameter limit allows. Statements are sent in
+    pipeline mode (no round-trip wait between them) and server-prepared, so
+    repeated shapes only pay for Bind/Execute.
+    """
+    rows_per_stmt = max(1, min(chunk_size, MAX_PARAMS // len(cols)))
+    adapt = _row_adapter(cols)
+
+    # render each statement shape once instead of on every execute
+    rendered: Dict[int, bytes] = {}
+    start = 0
+    with cur.connection.pipeline():
+        for size in _statement_sizes(len(items), rows_per_stmt):
+            stmt = rendered.get(size)
+            if stmt is None:
+                query = _make_upsert_query(table, cols, pk, rows_per_stmt=size)
+                stmt = rendered[size] = query.as_bytes(cur)
+            chunk = items[start : start + size]
+            params = tuple(itertools.chain.from_iterable(map(adapt, chunk)))
+            cur.execute(stmt, params, prepare=True)
+            start += size
+    return len(items)
+
+
+def _copy_upsert(
+    cur: psycopg.Cursor,
+    table: str,
+    cols: Tuple[str, ...],
+    items: Iterable[Dict[str, Any]],
+    pk: str = "id",
+) -> int:
+    """
+    Stream rows with COPY into a temp table shaped like `table`, then merge
+    them with a single INSERT ... SELECT ... ON CONFLICT statement.
+    """
+    staging = _staging_ident(table)
+    # the staging table lives as long as the session and is never dropped:
+    # a DROP makes psycopg deallocate every prepared statement on the
+    # connection. Utility statements are not worth preparing, hence
+    # prepare=False on them
+    cur.execute(
+        sql.SQL(
+            "CREATE TEMP TABLE IF NOT EXISTS {} "
+            "(LIKE {} INCLUDING DEFAULTS, _seq bigint) ON COMMIT DELETE ROWS"
+        ).format(staging, _table_ident(table)),
+        prepare=False,
+    )
+
+    total = 0
+    copy_stmt = sql.SQL("COPY {} ({}, _seq) FROM STDIN").format(
+        staging, sql.SQL(", ").join(sql.Identifier(c) for c in cols)
+    )
+    adapt = _row_adapter(cols)
+    t0 = time.perf_counter()
+    with cur.copy(copy_stmt) as cp:
+        # _seq records arrival order so the merge can keep the last duplicate
+        for r in items:
+            cp.write_row((*adapt(r), total))
+            total += 1
+    t1 = time.perf_counter()
+
+    cur.execute(_make_upsert_query(table, cols, pk))
+    # copy covers producing/adapting rows plus the wire, merge is server-side
+    logger.debug(
+        "[db] %s: copy %.1f ms, merge %.1f ms",
+        table,
+        (t1 - t0) * 1000,
+        (time.perf_counter() - t1) * 1000,
+    )
+    # several upserts of the same table can share one transaction, so empty
+    # the staging table now rather than at commit
+    cur.execute(sql.SQL("TRUNCATE {}").format(staging), prepare=False)
+    return total
+
+
+def _dedupe(items: List[Dict[str, Any]], pk: str) -> List[Dict[str, Any]]:
+    """
+    Keep only the last row per key, so one statement never hits the same
+    row twice (ON CONFLICT DO UPDATE rejects that with a cardinality error).
+    """
+    by_key = {r.get(pk): r for r in items}
+    if len(by_key) == len(items):
+        return items
+    logger.debug(f"[db] dropped {len(items) - len(by_key)} duplicate {pk} values")
+    return list(by_key.values())
+
+
 def upsert_table(
     conn: psycopg.Connection,
     table: str,
@@ -68,67 +350,114 @@ def upsert_table(
     chunk_size: int = 500,
     pk: str = "id",
 ) -> int:
-    items = [r for r in rows]
-    if not items:
+    """
+    Upsert `rows` into `table`. Rows are consumed lazily: only the first
+    COPY_THRESHOLD rows are buffered to pick between the VALUES and COPY
+    paths, the rest is streamed straight into COPY.
+    The load runs in its own `conn.transaction()` block: on an idle
+    connection it is committed on success, inside a caller's transaction
+    block it becomes a savepoint, so group several upserts under one
+    `with conn.transaction():` to pay for a single commit. Either way a
+    failure is rolled back before the error propagates, leaving no aborted
+    transaction behind.
+    """
+    t0 = time.perf_counter()
+    it = iter(rows)
+    first = next(it, None)
+    if first is None:
         logger.debug("[db] upsert_table: no rows to upsert")
         return 0
 
-    cols = list(items[0].keys())
-    for r in items:
-        # ensure all rows have the same keys
-        for c in cols:
-            r.setdefault(c, None)
+    # rows are read positionally by _row_adapter, so missing keys become NULL
+    # without normalizing (and mutating) every input dict first
+    cols = tuple(first.keys())
+    head = [first, *itertools.islice(it, COPY_THRESHOLD)]
+    t1 = time.perf_counter()
 
-    query = _make_upsert_query(table, cols, pk=pk)
-    total = 0
     try:
-        with conn.cursor() as cur:
-            for chunk in (
-                items[i : i + chunk_size] for i in range(0, len(items), chunk_size)
-            ):
-                cur.executemany(query.as_string(conn), chunk)
-                total += len(chunk)
-        conn.commit()
-        logger.info(f"[db] upserted {total} rows into {table}")
+        with conn.transaction(), conn.cursor() as cur:
+            use_copy = len(head) > COPY_THRESHOLD
+            if use_copy:
+                items = itertools.chain(head, it)
+                total = _copy_upsert(cur, table, cols, items, pk=pk)
+            else:
+                _values_upsert(
+                    cur,
+                    table,
+                    cols,
+                    _dedupe(head, pk),
+                    chunk_size,
+                    pk=pk,
+                )
+                total = len(head)
+        # read_ms is time spent waiting on the row source before the first
+        # statement; load_ms is everything after (for COPY that still includes
+        # pulling the rest of a streamed input)
+        logger.info(
+            "[db] upserted %d rows into %s via %s (read_ms=%.1f load_ms=%.1f)",
+            total,
+            table,
+            "copy" if use_copy else "values",
+            (t1 - t0) * 1000,
+            (time.perf_counter() - t1) * 1000,
+        )
     except Exception:
-        conn.rollback()
         logger.exception("[db] upsert_table failed")
         raise
     return total
 
 
-# convenience wrapper for inventory (keeps compatibility with previous code)
-def upsert_inventory(
-    conn: psycopg.Connection, rows: Iterable[Dict[str, Any]], chunk_size: int = 500
+# raw table per entity; upsert SQL and row adapters are derived from the row
+# keys at load time, so adding an entity only needs an entry here
+RAW_TABLES: Dict[str, str] = {
+    "inventory": "public.raw_inventory",
+    "order_hdr": "public.raw_order_hdr",
+    "order_dtl": "public.raw_order_dtl",
+    "container": "public.raw_container",
+    "location": "public.raw_location",
+    "oblpn": "public.raw_oblpn",
+    "order_status": "public.raw_order_status",
+    "container_status": "public.raw_container_status",
+}
+
+
+def upsert_raw(
+    conn: psycopg.Connection,
+    entity: str,
+    rows: Iterable[Dict[str, Any]],
+    chunk_size: int = 500,
 ) -> int:
-    return upsert_table(
-        conn, "public.raw_inventory", rows, chunk_size=chunk_size, pk="id"
-    )
+    return upsert_table(conn, RAW_TABLES[entity], rows, chunk_size=chunk_size, pk="id")
+
+
+# convenience wrappers (keep compatibility with previous code)
+def upsert_inventory(conn, rows, chunk_size: int = 500) -> int:
+    return upsert_raw(conn, "inventory", rows, chunk_size)
 
 
 def upsert_order_hdr(conn, rows, chunk_size: int = 500) -> int:
-    return upsert_table(
-        conn, "public.raw_order_hdr", rows, chunk_size=chunk_size, pk="id"
-    )
+    return upsert_raw(conn, "order_hdr", rows, chunk_size)
 
 
 def upsert_order_dtl(conn, rows, chunk_size: int = 500) -> int:
-    return upsert_table(
-        conn, "public.raw_order_dtl", rows, chunk_size=chunk_size, pk="id"
-    )
+    return upsert_raw(conn, "order_dtl", rows, chunk_size)
 
 
 def upsert_container(conn, rows, chunk_size: int = 500) -> int:
-    return upsert_table(
-        conn, "public.raw_container", rows, chunk_size=chunk_size, pk="id"
-    )
+    return upsert_raw(conn, "container", rows, chunk_size)
 
 
 def upsert_location(conn, rows, chunk_size: int = 500) -> int:
-    return upsert_table(
-        conn, "public.raw_location", rows, chunk_size=chunk_size, pk="id"
-    )
+    return upsert_raw(conn, "location", rows, chunk_size)
 
 
 def upsert_oblpn(conn, rows, chunk_size: int = 500) -> int:
-    return upsert_table(conn, "public.raw_oblpn", rows, chunk_size=chunk_size, pk="id")
+    return upsert_raw(conn, "oblpn", rows, chunk_size)
+
+
+def upsert_container_status(conn, rows, chunk_size: int = 500) -> int:
+    return upsert_raw(conn, "container_status", rows, chunk_size)
+
+
+def upsert_order_status(conn, rows, chunk_size: int = 500) -> int:
+    return upsert_raw(conn, "order_status", rows, chunk_size)
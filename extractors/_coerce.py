@@ -0,0 +1,88 @@
+# _coerce.py
+"""
+Field coercers shared by the extractors' _FIELD_COERCERS tables. Each one
+takes a raw API value and returns the value to store, mapping missing or
+unparsable input to None (or 0.0 for safe_float_or_zero).
+"""
+
+from __future__ import annotations
+from typing import Any
+from datetime import date, datetime
+
+from utils import dump_json, parse_iso_datetime
+
+_TRUE_LOWER = frozenset({"true", "t", "1", "yes", "y"})
+# common spellings matched as-is, so only unusual casing pays for .lower()
+_TRUE_STRINGS = _TRUE_LOWER | {"True", "TRUE", "T", "Yes", "YES", "Y"}
+
+
+def safe_float(v: Any) -> float | None:
+    # JSON numbers arrive already typed; skip the checks and the try
+    if type(v) is float:  # noqa: E721
+        return v
+    if v in (None, "", "null"):
+        return None
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        return None
+
+
+def safe_float_or_zero(v: Any) -> float:
+    # quantities in inventory/oblpn default to 0.0 instead of NULL
+    f = safe_float(v)
+    return 0.0 if f is None else f
+
+
+def safe_int(v: Any) -> int | None:
+    # exact type check: bools still go through int() and come out as 0/1
+    if type(v) is int:  # noqa: E721
+        return v
+    if v in (None, "", "null"):
+        return None
+    try:
+        return int(v)
+    except (TypeError, ValueError):
+        return None
+
+
+def safe_bool(v: Any) -> bool | None:
+    if v is None:
+        return None
+    if v is True or v is False:
+        return v
+    if isinstance(v, str):
+        return v in _TRUE_STRINGS or v.lower() in _TRUE_LOWER
+    return bool(v)
+
+
+def parse_datetime(s: Any) -> datetime | None:
+    if isinstance(s, datetime):
+        return s
+    if not s or not isinstance(s, str):
+        return None
+    # fromisoformat already accepts the plain "%Y-%m-%dT%H:%M:%S" form
+    return parse_iso_datetime(s)
+
+
+def parse_date(s: Any) -> date | None:
+    if not s or not isinstance(s, str):
+        return None
+    if len(s) == 10:
+        # plain YYYY-MM-DD, the usual shape
+        try:
+            return date.fromisoformat(s)
+        except ValueError:
+            return None
+    if "T" in s:
+        parsed = parse_iso_datetime(s)
+        return parsed.date() if parsed else None
+    try:
+        return datetime.strptime(s, "%Y-%m-%d").date()
+    except ValueError:
+        return None
+
+
+def json_list(v: Any) -> Any:
+    # collection fields are stored as JSON text
+    return dump_json(v) if isinstance(v, list) else v
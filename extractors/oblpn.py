@@ -1,5 +1,5 @@
 from __future__ import annotations
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Dict, List, Optional
 import asyncio
 import logging
 from datetime import datetime, timedelta
@@ -7,145 +7,127 @@ from datetime import datetime, timedelta
 import httpx
 
 from config import get_today_range
-from utils import flatten_one_level, batched
+from utils import flatten_and_coerce, batched
 from wms_client import WMSClient
 from db import upsert_oblpn
+from extractors._coerce import (
+    safe_float_or_zero as _safe_float,
+    safe_int as _safe_int,
+    parse_datetime as _parse_iso_date,
+    json_list as _json_list,
+)
+
+__all__ = ["extract_and_upsert_oblpn"]
 
 logger = logging.getLogger(__name__)
 
 
-# === Funções auxiliares ===
+# === Normalização / Flatten ===
 
 
-def _safe_float(v: Any) -> float:
-    if v in (None, "", "null"):
-        return 0.0
-    try:
-        return float(v)
-    except Exception:
-        return 0.0
+# field name -> coercion, applied while the record is flattened
+_FIELD_COERCERS: Dict[str, Callable[[Any], Any]] = {
+    **dict.fromkeys(["weight", "volume", "length", "width", "height"], _safe_float),
+    **dict.fromkeys(
+        [
+            "id",
+            "facility_id_id",
+            "company_id_id",
+            "curr_location_id_id",
+            "prev_location_id_id",
+            "status_id",
+            "vas_status_id",
+            "audit_status_id",
+            "qc_status_id",
+            "lpn_type_id",
+            "cart_posn_nbr",
+            "nbr_files",
+        ],
+        _safe_int,
+    ),
+    **dict.fromkeys(
+        ["create_ts", "mod_ts", "rcvd_ts", "first_putaway_ts"], _parse_iso_date
+    ),
+    "inventory_lock_set": _json_list,
+}
 
 
-def _safe_int(v: Any) -> Optional[int]:
-    if v in (None, "", "null"):
-        return None
-    try:
-        return int(v)
-    except Exception:
-        return None
+def _flatten_oblpn_record(rec: Dict[str, Any]) -> Dict[str, Any]:
+    return flatten_and_coerce(rec, _FIELD_COERCERS)
 
 
-def _parse_iso_date(s: Any) -> Optional[datetime]:
-    if not s:
-        return None
-    try:
-        return datetime.fromisoformat(s.replace("Z", "+00:00"))
-    except Exception:
-        try:
-            return datetime.strptime(s, "%Y-%m-%dT%H:%M:%S")
-        except Exception:
-            return None
-
+# === Fetch assíncrono de detalhes ===
 
-# === Normalização / Flatten ===
+# summaries per pipeline step: one window's details are fetched while the
+# previous window is flattened and upserted
+_WINDOW = 2_000
 
 
-def _flatten_oblpn_record(rec: Dict[str, Any]) -> Dict[str, Any]:
-    flat = flatten_one_level(rec)
-
-    # Convert numeric-like strings
-    for q in ["weight", "volume", "length", "width", "height"]:
-        if q in flat:
-            flat[q] = _safe_float(flat.get(q))
-
-    # Integers
-    for i in [
-        "id",
-        "facility_id_id",
-        "company_id_id",
-        "curr_location_id_id",
-        "prev_location_id_id",
-        "status_id",
-        "vas_status_id",
-        "audit_status_id",
-        "qc_status_id",
-        "lpn_type_id",
-        "cart_posn_nbr",
-        "nbr_files",
-    ]:
-        if i in flat:
-            flat[i] = _safe_int(flat.get(i))
-
-    # Dates / timestamps
-    for ts in ["create_ts", "mod_ts", "rcvd_ts", "first_putaway_ts"]:
-        if ts in flat:
-            flat[ts] = _parse_iso_date(flat.get(ts))
-
-    # Nested (relacionais)
-    nested = [
-        "facility_id",
-        "company_id",
-        "curr_location_id",
-        "prev_location_id",
+def _upsert_window(
+    conn,
+    window: List[Dict[str, Any]],
+    details: List[Optional[Dict[str, Any]]],
+) -> int:
+    # keep the summary wherever the detail fetch came back empty
+    merged = [
+        detail if isinstance(detail, dict) and detail else summary
+        for summary, detail in zip(window, details)
     ]
-    for n in nested:
-        if n in rec and isinstance(rec[n], dict):
-            if "id" in rec[n]:
-                flat[f"{n}_id"] = rec[n].get("id")
-            if "key" in rec[n]:
-                flat[f"{n}_key"] = rec[n].get("key")
-            if "url" in rec[n]:
-                flat[f"{n}_url"] = rec[n].get("url")
-
-    return flat
+    return upsert_oblpn(conn, map(_flatten_oblpn_record, merged))
 
 
-# === Fetch assíncrono de detalhes ===
-
+async def _fetch_and_upsert(
+    client: WMSClient, conn, items: List[Dict[str, Any]]
+) -> int:
+    """
+    Pipeline detail fetches with the upserts: a producer fetches details
+    window by window into a bounded queue (so it waits once it is two
+    windows ahead) while a consumer flattens and upserts each window in a
+    worker thread, keeping the event loop free for the next fetches.
+    """
+    queue: asyncio.Queue = asyncio.Queue(maxsize=2)
 
-async def _fetch_details_for_batch(
-    client: WMSClient, ids: List[Any], concurrency: int = 10
-) -> List[Optional[Dict[str, Any]]]:
-    sem = asyncio.Semaphore(concurrency)
-    out: List[Optional[Dict[str, Any]]] = []
+    async def produce() -> None:
+        for window in batched(items, _WINDOW):
+            # one id per summary (None when missing) so details line up
+            ids = [it.get("id") for it in window]
+            details = await client.fetch_details_many("oblpn", ids)
+            await queue.put((window, details))
+        await queue.put(None)
 
-    async def _fetch_one(eid):
-        await sem.acquire()
-        try:
-            return await client.fetch_one_detail("oblpn", eid)
-        except httpx.HTTPStatusError as e:
-            logger.warning("fetch detail status error for oblpn %s: %s", eid, e)
-            return None
-        except Exception:
-            logger.exception("fetch detail failed for oblpn %s", eid)
-            return None
-        finally:
-            sem.release()
+    async def consume() -> int:
+        total = 0
+        while (batch := await queue.get()) is not None:
+            total += await asyncio.to_thread(_upsert_window, conn, *batch)
+        return total
 
-    tasks = [asyncio.create_task(_fetch_one(i)) for i in ids]
-    results = await asyncio.gather(*tasks, return_exceptions=False)
-    out.extend(results)
-    return out
+    # a failure on either side cancels the other and propagates
+    async with asyncio.TaskGroup() as tg:
+        tg.create_task(produce())
+        consumer = tg.create_task(consume())
+    return consumer.result()
 
 
 # === Função principal ===
 
 
-def extract_and_upsert_oblpn(client: WMSClient, conn) -> int:
+async def extract_and_upsert_oblpn(client: WMSClient, conn) -> int:
     """
     Extrai dados de OBLPN (Outbound LPN), coleta detalhes e faz upsert no banco.
     Se não houver dados para o dia atual, busca dos últimos 2 dias.
     """
     dr = get_today_range()
     params_today = {
-        "create_ts__gte": dr.start.strftime("%Y-%m-%dT%H:%M:%S"),
-        "create_ts__lt": dr.end.strftime("%Y-%m-%dT%H:%M:%S"),
+        "create_ts__gte": dr.start.isoformat(timespec="seconds"),
+        "create_ts__lt": dr.end.isoformat(timespec="seconds"),
     }
 
     logger.info("Fetching OBLPN summary pages (sync)...")
     items = []
     try:
-        items = client.fetch_all_sync("oblpn", params=params_today)
+        items = await asyncio.to_thread(
+            client.fetch_all_sync, "oblpn", params=params_today
+        )
         logger.info("Found %d oblpn summary records for today", len(items))
     except httpx.HTTPStatusError as e:
         if e.response.status_code == 404:
@@ -158,11 +140,13 @@ def extract_and_upsert_oblpn(client: WMSClient, conn) -> int:
         end_date = datetime.now()
         start_date = end_date - timedelta(days=2)
         params_retry = {
-            "create_ts__gte": start_date.strftime("%Y-%m-%dT%H:%M:%S"),
-            "create_ts__lt": end_date.strftime("%Y-%m-%dT%H:%M:%S"),
+            "create_ts__gte": start_date.isoformat(timespec="seconds"),
+            "create_ts__lt": end_date.isoformat(timespec="seconds"),
         }
         try:
-            items = client.fetch_all_sync("oblpn", params=params_retry)
+            items = await asyncio.to_thread(
+                client.fetch_all_sync, "oblpn", params=params_retry
+            )
             logger.info("Found %d OBLPN records in last 2 days", len(items))
         except httpx.HTTPStatusError as e:
             if e.response.status_code == 404:
@@ -175,52 +159,6 @@ def extract_and_upsert_oblpn(client: WMSClient, conn) -> int:
         logger.warning("No OBLPN records found at all.")
         return 0
 
-    ids = [it.get("id") for it in items if "id" in it]
-    all_details: List[Optional[Dict[str, Any]]] = []
-    batch_size = 50
-
-    async def _gather_all():
-        tasks = []
-        for i in range(0, len(ids), batch_size):
-            chunk = ids[i : i + batch_size]
-            tasks.append(
-                asyncio.create_task(
-                    _fetch_details_for_batch(client, chunk, concurrency=10)
-                )
-            )
-        results = await asyncio.gather(*tasks, return_exceptions=False)
-        for r in results:
-            all_details.extend(r)
-
-    try:
-        asyncio.run(_gather_all())
-    except RuntimeError as e:
-        logger.warning(
-            "Async loop unavailable (%s). Falling back to sync detail fetch for OBLPN.",
-            e,
-        )
-        for eid in ids:
-            try:
-                d = client._client.get(
-                    f"{client.base_url}/entity/oblpn/{eid}",
-                    headers=client._headers(),
-                )
-                d.raise_for_status()
-                jd = d.json()
-                all_details.append(jd.get("result", jd))
-            except Exception:
-                logger.exception("Failed sync detail for OBLPN %s", eid)
-                all_details.append(None)
-
-    merged = []
-    for summary, detail in zip(items, all_details):
-        merged.append(detail if isinstance(detail, dict) and detail else summary)
-
-    flattened = [_flatten_oblpn_record(m) for m in merged]
-
-    total = 0
-    for chunk in batched(flattened, 500):
-        total += upsert_oblpn(conn, chunk)
-
+    total = await _fetch_and_upsert(client, conn, items)
     logger.info("Finished OBLPN upsert, total rows: %d", total)
     return total
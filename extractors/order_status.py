@@ -5,8 +5,10 @@ from typing import Any, Dict, List
 from wms_client import WMSClient
 from db import upsert_order_status
 
+__all__ = ["extract_and_upsert_order_status"]
+
 
 def extract_and_upsert_order_status(client: WMSClient, conn) -> int:
     """Extract all order status data and upsert to database (lookup table - no date filter needed)"""
-    items: List[Dict[str, Any]] = client.fetch_all("order_status")
+    items: List[Dict[str, Any]] = client.fetch_all_sync("order_status")
     return upsert_order_status(conn, items)
@@ -1,9 +1,11 @@
 # main.py
 from __future__ import annotations
+import asyncio
+import inspect
 import logging
 import sys
 
-from db import get_connection
+from db import acquire, acquire_async, close_pool
 from wms_client import WMSClient
 from extractors.inventory import extract_and_upsert_inventory
 from extractors.order_hdr import extract_and_upsert_order_hdr
@@ -24,48 +26,72 @@ logging.basicConfig(
 logger = logging.getLogger("wms_etl")
 
 
+# (name, extractor); none of the raw tables depends on another's rows
+_EXTRACTORS = [
+    ("inventory", extract_and_upsert_inventory),
+    ("order_hdr", extract_and_upsert_order_hdr),
+    ("order_dtl", extract_and_upsert_order_dtl),
+    ("container", extract_and_upsert_container),
+    ("location", extract_and_upsert_location),
+    ("oblpn", extract_and_upsert_oblpn),
+    # outros extractors: acrescente aqui
+]
+
+
+def _run_sync_extractor(extract, client: WMSClient) -> int:
+    with acquire() as conn:
+        return extract(client, conn)
+
+
+async def _run_extractor(name: str, extract, client: WMSClient) -> int:
+    # each extractor gets its own pooled connection, since they run at the
+    # same time; sync extractors run in a worker thread, connection checkout
+    # and return included, so nothing blocks the shared event loop
+    logger.info("Extracting %s data...", name)
+    if inspect.iscoroutinefunction(extract):
+        async with acquire_async() as conn:
+            count = await extract(client, conn)
+    else:
+        count = await asyncio.to_thread(_run_sync_extractor, extract, client)
+    logger.info("%s processed: %d", name.capitalize(), count)
+    return count
+
+
+async def _amain() -> None:
+    # one event loop and one WMSClient (with its pooled async connections)
+    # for the whole run; the extractors hit different endpoints and tables,
+    # so they run concurrently
+    async with WMSClient() as client:
+        results = await asyncio.gather(
+            *(_run_extractor(name, fn, client) for name, fn in _EXTRACTORS),
+            return_exceptions=True,
+        )
+    # let the other extractors finish before reporting a failed one
+    errors = [
+        (name, r)
+        for (name, _), r in zip(_EXTRACTORS, results)
+        if isinstance(r, BaseException)
+    ]
+    for name, err in errors[1:]:
+        logger.error("Extraction of %s failed", name, exc_info=err)
+    if errors:
+        # main() logs the one that is raised, so only tag it with its name
+        name, err = errors[0]
+        err.add_note(f"Extraction of {name} failed")
+        raise err
+
+
 def main() -> None:
     try:
         logger.info("Starting WMS data extraction")
-
-        conn = get_connection()
-        with WMSClient() as client:
-            # inventory
-            logger.info("Extracting inventory data...")
-            inv_count = extract_and_upsert_inventory(client, conn)
-            logger.info("Inventory processed: %d", inv_count)
-
-            logger.info("Extracting order_hdr data...")
-            hdr_count = extract_and_upsert_order_hdr(client, conn)
-            logger.info("Order_hdr processed: %d", hdr_count)
-
-            logger.info("Extracting order_dtl data...")
-            dtl_count = extract_and_upsert_order_dtl(client, conn)
-            logger.info("Order_dtl processed: %d", dtl_count)
-
-            logger.info("Extracting container data...")
-            cont_count = extract_and_upsert_container(client, conn)
-            logger.info("Container processed: %d", cont_count)
-
-            logger.info("Extracting location data...")
-            loc_count = extract_and_upsert_location(client, conn)
-            logger.info("Location processed: %d", loc_count)
-
-            logger.info("Extracting oblpn data...")
-            loc_count = extract_and_upsert_oblpn(client, conn)
-            logger.info("Oblpn processed: %d", loc_count)
-
-            # outros extractors (exemplo)
-            # logger.info("Extracting container data...")
-            # cont_count = extract_and_upsert_container(client, conn)
-            # logger.info("Container processed: %d", cont_count)
-
-        conn.close()
+        asyncio.run(_amain())
         logger.info("Extraction finished successfully")
 
     except Exception:
         logger.exception("Fatal error during extraction")
         raise
+    finally:
+        close_pool()
 
 
 if __name__ == "__main__":
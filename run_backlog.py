@@ -12,7 +12,7 @@ from datetime import datetime, timedelta
 from typing import List, Dict, Any
 
 from wms_client import WMSClient
-from db import get_connection
+from db import acquire
 from extractors.oblpn import _flatten_oblpn_record  # ✅ novo import
 
 # -----------------------------------------------------------------------------
@@ -186,13 +186,12 @@ def main():
     ensure_dir(OUTPUT_DIR)
 
     client = WMSClient()
-    conn = get_connection()  # noqa: F841
-
-    for entity, flattener in ACTIVE_EXTRACTORS.items():
-        try:
-            fetch_backlog(client, entity, flattener, START_DATE, END_DATE)
-        except Exception as e:
-            logger.error(f"Erro ao processar {entity}: {e}")
+    with acquire() as conn:  # noqa: F841
+        for entity, flattener in ACTIVE_EXTRACTORS.items():
+            try:
+                fetch_backlog(client, entity, flattener, START_DATE, END_DATE)
+            except Exception as e:
+                logger.error(f"Erro ao processar {entity}: {e}")
 
     logger.info(
         "✅ Backlog exportado com sucesso! CSVs disponíveis em ./backlog_exports/"
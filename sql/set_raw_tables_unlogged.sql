@@ -0,0 +1,13 @@
+-- Optional: turn the raw_inventory, raw_container, raw_container_status
+-- and raw_location landing tables into UNLOGGED tables.
+--
+-- Writes to UNLOGGED tables skip WAL, which makes the bulk upserts
+-- considerably faster, but after a server crash these tables are emptied.
+-- See "Durability of the raw tables" in README.md for what is lost.
+--
+-- Revert with: alter table ... set logged;
+
+alter table if exists public.raw_inventory set unlogged;
+alter table if exists public.raw_container set unlogged;
+alter table if exists public.raw_container_status set unlogged;
+alter table if exists public.raw_location set unlogged;
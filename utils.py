@@ -1,33 +1,71 @@
 # utils.py
-from typing import Any, Dict, Iterable, List, Generator
+from datetime import datetime, tzinfo
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterable, List, Generator, Optional
 import itertools
 
+import orjson
 
-def flatten_one_level(d: Dict[str, Any]) -> Dict[str, Any]:
+
+def flatten_and_coerce(
+    d: Dict[str, Any], coercers: Dict[str, Callable[[Any], Any]]
+) -> Dict[str, Any]:
     """
-    Collapse immediate nested dicts into fields with suffixes:
-    { 'facility_id': {'id': 1, 'url': '...'}, 'x': 1 } ->
-    { 'facility_id_id': 1, 'facility_id_url': '...', 'x': 1 }
+    Collapse immediate nested dicts into `parent_child` fields and coerce
+    values in one pass:
+    { 'facility_id': {'id': '1'}, 'x': 1 } -> { 'facility_id_id': 1, 'x': 1 }
+    with coercers={'facility_id_id': int}. Every output key is run through
+    its coercer, if `coercers` has one, as it is written.
     """
     out: Dict[str, Any] = {}
+    get = coercers.get
     for k, v in d.items():
         if isinstance(v, dict):
-            # keep nested keys with predictable suffixes
-            if "id" in v:
-                out[f"{k}_id"] = v.get("id")
-            if "key" in v:
-                out[f"{k}_key"] = v.get("key")
-            if "url" in v:
-                out[f"{k}_url"] = v.get("url")
-            # keep original flattened content (others)
+            prefix = f"{k}_"
             for subk, subv in v.items():
-                if subk not in {"id", "key", "url"}:
-                    out[f"{k}_{subk}"] = subv
+                key = prefix + subk
+                coerce = get(key)
+                out[key] = subv if coerce is None else coerce(subv)
         else:
-            out[k] = v
+            coerce = get(k)
+            out[k] = v if coerce is None else coerce(v)
     return out
 
 
+def dump_json(v: Any) -> Optional[str]:
+    """
+    Serialize a list/dict value as compact JSON text, so collection fields
+    are stored as strings instead of going through psycopg's array adapter.
+    """
+    if v is None:
+        return None
+    return orjson.dumps(v).decode()
+
+
+# one shared tzinfo per UTC offset, instead of one per parsed timestamp
+_TZ_CACHE: Dict[tzinfo, tzinfo] = {}
+
+
+@lru_cache(maxsize=131072)
+def parse_iso_datetime(s: str) -> Optional[datetime]:
+    """
+    Parse an ISO-8601 timestamp string, or return None if it is not one.
+    Cached because WMS payloads repeat the same create_ts/mod_ts values
+    across many rows; datetimes are immutable, so sharing them is safe.
+    """
+    try:
+        # fromisoformat accepts a trailing "Z" since Python 3.11
+        dt = datetime.fromisoformat(s)
+    except ValueError:
+        return None
+    tz = dt.tzinfo
+    if tz is not None:
+        shared = _TZ_CACHE.setdefault(tz, tz)
+        if shared is not tz:
+            dt = dt.replace(tzinfo=shared)
+    return dt
+
+
 def batched(iterable: Iterable, n: int) -> Generator[List, None, None]:
     """
     Yield lists of length up to n.
@@ -1,6 +1,7 @@
 # wms_client.py
 from __future__ import annotations
 from typing import Any, Dict, List, Optional, AsyncIterator
+import asyncio
 import logging
 
 import httpx
@@ -17,8 +18,8 @@ class WMSClient:
       with WMSClient() as c:
           c.fetch_all_sync(...)
       or
-      async with WMSClient(async_mode=True) as ac:
-          await ac.fetch_all_async(...)
+      async with WMSClient() as ac:
+          await ac.fetch_one_detail(...)
     """
 
     def __init__(
@@ -41,6 +42,8 @@ class WMSClient:
             timeout if timeout is not None else cfg.get("default_timeout", 30.0)
         )
         self.retries = retries if retries is not None else cfg.get("default_retries", 3)
+        # max in-flight detail requests for fetch_details_many
+        self.concurrency = cfg.get("default_concurrency", 10)
 
         if not all([self.base_url, self.username, self.password]):
             raise ValueError("WMSClient requires base_url, username and password")
@@ -66,9 +69,19 @@ class WMSClient:
             # can't await here; user should use async context for async client
             pass
 
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.__exit__(exc_type, exc, tb)
+        await self.aclose()
+
     async def aclose(self):
         if self._async_client is not None:
             await self._async_client.aclose()
+            # the client is bound to the loop that created it; the next
+            # asyncio.run() gets a fresh one
+            self._async_client = None
 
     def _headers(self) -> Dict[str, str]:
         return {"Accept": "application/json"}
@@ -102,10 +115,17 @@ class WMSClient:
     # ---------------------- ASYNC helpers ----------------------
     async def _ensure_async_client(self) -> httpx.AsyncClient:
         if self._async_client is None:
+            # HTTP/2 multiplexes the detail fan-out over a few connections
+            # instead of one TLS handshake per concurrent request
             self._async_client = httpx.AsyncClient(
                 timeout=self.timeout,
                 verify=self.verify_ssl,
                 auth=(self.username, self.password),
+                http2=True,
+                limits=httpx.Limits(
+                    max_connections=self.concurrency,
+                    max_keepalive_connections=self.concurrency,
+                ),
             )
         return self._async_client
 
@@ -148,3 +168,33 @@ class WMSClient:
         resp.raise_for_status()
         data = resp.json()
         return data.get("result", data)
+
+    async def fetch_details_many(
+        self, entity: str, ids: List[Any]
+    ) -> List[Optional[Dict[str, Any]]]:
+        """
+        Fetch the detail of every id with `concurrency` worker coroutines
+        pulling from one shared iterator, so that many requests stay in flight
+        until the last id is done. Results keep the order of `ids`; failed or
+        missing ids give None.
+        """
+        out: List[Optional[Dict[str, Any]]] = [None] * len(ids)
+        # workers only yield at the await, so sharing the iterator is safe
+        pending = iter(enumerate(ids))
+
+        async def _worker():
+            for i, eid in pending:
+                if eid is None:
+                    continue
+                try:
+                    out[i] = await self.fetch_one_detail(entity, eid)
+                except httpx.HTTPStatusError as e:
+                    logger.warning(
+                        "fetch detail status error for %s %s: %s", entity, eid, e
+                    )
+                except Exception:
+                    logger.exception("fetch detail failed for %s %s", entity, eid)
+
+        workers = min(self.concurrency, len(ids))
+        await asyncio.gather(*(_worker() for _ in range(workers)))
+        return out